@@ -3,51 +3,435 @@ Simple Workflow Engine
 This is the core engine that manages nodes, state, and execution flow.
 """
 
-from typing import Dict, List, Callable, Any, Optional
-from enum import Enum
+import asyncio
+import dataclasses
+from array import array
+import inspect
+import marshal
+import pickle
+import threading
+from dataclasses import dataclass, field
+from hashlib import blake2b
+from typing import Dict, List, Callable, Any, Iterator, Optional, Set
+from enum import IntEnum
 
 
-class NodeStatus(Enum):
+class NodeStatus(IntEnum):
     """Status of a node execution"""
-    PENDING = "pending"
-    RUNNING = "running"
-    COMPLETED = "completed"
-    FAILED = "failed"
+    PENDING = 0
+    RUNNING = 1
+    COMPLETED = 2
+    FAILED = 3
+
+
+# NodeStatus value -> name used in API responses
+_STATUS_NAMES = ("pending", "running", "completed", "failed")
+
+
+@dataclass(slots=True)
+class ReviewState:
+    """
+    Typed state for the code review workflow
+    
+    Nodes use plain attributes. The dict-style methods (get, [], pop,
+    update, ...) let the engine and the tools treat it like any other
+    state; keys that aren't fields are kept in `extra`.
+    """
+    code: str = ""
+    threshold: int = 70
+    function_count: int = 0
+    extracted: bool = False
+    issues: List[str] = field(default_factory=list)
+    issue_count: int = 0
+    complexity_score: int = 0
+    suggestions: List[str] = field(default_factory=list)
+    quality_score: int = 0
+    quality_met: bool = False
+    loop_continue: bool = False
+    loop_node: Optional[str] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ReviewState":
+        """Build a state from a plain dict (unknown keys go to extra)"""
+        known = {key: value for key, value in data.items() if key in _REVIEW_FIELDS}
+        extra = {key: value for key, value in data.items() if key not in _REVIEW_FIELDS}
+        return cls(**known, extra=extra)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Flatten into a plain dict (optional fields that were never set are left out)"""
+        data = {name: getattr(self, name) for name in _REVIEW_FIELDS
+                if getattr(self, name) is not None}
+        data.update(self.extra)
+        return data
+    
+    def copy(self) -> "ReviewState":
+        """Shallow copy (one struct copy, field values are shared)"""
+        return dataclasses.replace(self, extra=self.extra.copy())
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in _REVIEW_FIELDS:
+            value = getattr(self, key)
+            # None means "not set" for optional fields
+            return default if value is None else value
+        return self.extra.get(key, default)
+    
+    def pop(self, key: str, *default: Any) -> Any:
+        if key in _REVIEW_FIELDS:
+            value = getattr(self, key)
+            setattr(self, key, _REVIEW_DEFAULTS[key]())
+            return value
+        return self.extra.pop(key, *default)
+    
+    def update(self, other: Dict[str, Any]):
+        for key, value in other.items():
+            self[key] = value
+    
+    def items(self) -> Iterator[tuple]:
+        for name in _REVIEW_FIELDS:
+            yield name, getattr(self, name)
+        yield from self.extra.items()
+    
+    def keys(self) -> Iterator[str]:
+        yield from _REVIEW_FIELDS
+        yield from self.extra
+    
+    def __getitem__(self, key: str) -> Any:
+        if key in _REVIEW_FIELDS:
+            return getattr(self, key)
+        return self.extra[key]
+    
+    def __setitem__(self, key: str, value: Any):
+        if key in _REVIEW_FIELDS:
+            setattr(self, key, value)
+        else:
+            self.extra[key] = value
+    
+    def __contains__(self, key: str) -> bool:
+        return key in _REVIEW_FIELDS or key in self.extra
+    
+    def __iter__(self) -> Iterator[str]:
+        return self.keys()
+
+
+def _field_default(f: dataclasses.Field) -> Callable:
+    if f.default_factory is not dataclasses.MISSING:
+        return f.default_factory
+    return lambda: f.default
+
+
+# Field name -> factory for its default value (insertion ordered)
+_REVIEW_DEFAULTS: Dict[str, Callable] = {
+    f.name: _field_default(f) for f in dataclasses.fields(ReviewState) if f.name != "extra"
+}
+_REVIEW_FIELDS = _REVIEW_DEFAULTS.keys()
+
+
+def state_to_dict(state: Any) -> Dict[str, Any]:
+    """Convert a workflow state into a plain dict (for the API layer)"""
+    if isinstance(state, ReviewState):
+        return state.to_dict()
+    return dict(state)
+
+
+# Marks a key that was removed from the state in a snapshot diff
+_REMOVED = object()
+
+# Placeholder for the state keys a cached node doesn't depend on
+_UNSET = object()
+
+
+def _detach(value: Any) -> Any:
+    """Copy containers so cached outputs aren't shared between runs"""
+    return value.copy() if isinstance(value, (list, dict, set)) else value
+
+
+class ExecutionLog:
+    """
+    Execution log stored column-wise, one slot per node run
+    
+    Node ids, statuses and iterations live in typed arrays (int32, uint8,
+    int32) appended in lockstep; entries are only turned into dicts when
+    the log is serialized.
+    
+    State snapshots are opt-in (keep_snapshots). They are stored as the keys
+    that changed since the previous
+    snapshot, so memory grows with what nodes change rather than with
+    iterations x state size. Full snapshots are rebuilt in to_list.
+    """
+    
+    def __init__(self, node_names: List[str], keep_snapshots: bool = False):
+        self.node_names = node_names  # node id -> name, shared with the graph
+        self.keep_snapshots = keep_snapshots
+        self.node_ids = array("i")
+        self.statuses = array("B")  # NodeStatus values
+        self.iterations = array("i")
+        self.snapshots: List[Optional[Dict[str, Any]]] = []  # changed keys, None if no snapshot
+        self.errors: Dict[int, str] = {}  # entry index -> error message
+        self._last: Dict[str, Any] = {}  # state as of the latest snapshot
+    
+    def append(self, node_id: int, status: int, iteration: int) -> int:
+        """Add an entry and return its index"""
+        self.node_ids.append(node_id)
+        self.statuses.append(status)
+        self.iterations.append(iteration)
+        self.snapshots.append(None)
+        return len(self.node_ids) - 1
+    
+    def snapshot(self, index: int, state: Dict[str, Any]):
+        """Record the state after entry `index` as a diff to the previous snapshot"""
+        if isinstance(state, ReviewState):
+            # Same shape as the final state in API responses
+            state = state.to_dict()
+        last = self._last
+        diff = {}
+        seen = 0
+        for key, value in state.items():
+            seen += 1
+            if key not in last or last[key] is not value:
+                diff[key] = value
+                last[key] = value
+        if seen < len(last):
+            for key in [key for key in last if key not in state]:
+                diff[key] = _REMOVED
+                del last[key]
+        self.snapshots[index] = diff
+    
+    def __len__(self) -> int:
+        return len(self.node_ids)
+    
+    def to_list(self) -> List[Dict[str, Any]]:
+        """Expand into the list-of-dicts format used by the API"""
+        names = self.node_names
+        entries = [
+            {"node": names[node_id], "status": _STATUS_NAMES[status], "iteration": iteration}
+            for node_id, status, iteration in zip(self.node_ids, self.statuses, self.iterations)
+        ]
+        current = {}
+        for entry, diff in zip(entries, self.snapshots):
+            if diff is None:
+                continue
+            for key, value in diff.items():
+                if value is _REMOVED:
+                    current.pop(key, None)
+                else:
+                    current[key] = value
+            entry["state_snapshot"] = dict(current)
+        for index, error in self.errors.items():
+            entries[index]["error"] = error
+        return entries
+
+
+class NodeCache:
+    """
+    Remembers node outputs keyed by a fingerprint of the node's inputs
+    
+    Only the keys a node changed are stored, so a hit is a single dict
+    lookup plus a merge into the current state.
+    """
+    
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.entries: Dict[bytes, Dict[str, Any]] = {}  # fingerprint -> changed keys
+        self._lock = threading.Lock()  # nodes store from worker threads
+    
+    def identity(self, name: str, func: Callable) -> bytes:
+        """
+        Hash the node name and function
+        
+        Covers the function's code and closure, so graphs reusing a node
+        name for a different function don't share outputs.
+        """
+        func = getattr(func, "__func__", func)
+        code = getattr(func, "__code__", None)
+        if code is None:
+            return blake2b(repr((name, id(func))).encode(), digest_size=16).digest()
+        cells = []
+        for cell in func.__closure__ or ():
+            try:
+                cells.append(pickle.dumps(cell.cell_contents, protocol=5))
+            except Exception:
+                cells.append(id(cell.cell_contents))
+        data = pickle.dumps((name, func.__module__, func.__qualname__, marshal.dumps(code), cells),
+                            protocol=5)
+        return blake2b(data, digest_size=16).digest()
+    
+    def fingerprint(self, identity: bytes, state: Dict[str, Any], keys: Set[str]) -> Optional[bytes]:
+        """Hash a node identity and the given state keys (None if not picklable)"""
+        items = sorted((key, state[key]) for key in keys if key in state)
+        try:
+            data = pickle.dumps((identity, items), protocol=5)
+        except Exception:
+            return None
+        return blake2b(data, digest_size=16).digest()
+    
+    def get(self, fingerprint: bytes) -> Optional[Dict[str, Any]]:
+        """Get the stored output for a fingerprint"""
+        return self.entries.get(fingerprint)
+    
+    def put(self, fingerprint: bytes, diff: Dict[str, Any]):
+        """Store a node output, dropping the oldest entry when full"""
+        with self._lock:
+            if len(self.entries) >= self.maxsize:
+                self.entries.pop(next(iter(self.entries)))
+            self.entries[fingerprint] = diff
+    
+    def clear(self):
+        """Forget all stored outputs"""
+        with self._lock:
+            self.entries.clear()
+
+
+# Global node cache instance
+node_cache = NodeCache()
 
 
 class Node:
     """Represents a single node in the workflow"""
     
-    def __init__(self, name: str, func: Callable):
+    __slots__ = ("name", "func", "status", "cache_keys", "cache", "cache_id")
+    
+    def __init__(self, name: str, func: Callable, cache_keys: Optional[Set[str]] = None,
+                 cache: Optional[NodeCache] = None):
         self.name = name
         self.func = func
         self.status = NodeStatus.PENDING
+        # State keys the node output depends on; None disables caching
+        self.cache_keys = cache_keys
+        self.cache = cache if cache is not None else node_cache
+        self.cache_id = self.cache.identity(name, func) if cache_keys is not None else None
     
     def execute(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """Execute the node function with the current state"""
         self.status = NodeStatus.RUNNING
+        fingerprint, cached = self._lookup(state)
+        if cached is not None:
+            self.status = NodeStatus.COMPLETED
+            return self._apply(state, cached)
         try:
+            arg = state if fingerprint is None else self._inputs(state)
             # Node function receives state and returns updated state
-            updated_state = self.func(state)
+            updated_state = self.func(arg)
+            if fingerprint is not None:
+                updated_state = self._store(fingerprint, state, updated_state)
             self.status = NodeStatus.COMPLETED
             return updated_state
         except Exception as e:
             self.status = NodeStatus.FAILED
             raise e
-
+    
+    async def execute_async(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute the node function without blocking the event loop
+        
+        Coroutine functions are awaited directly, plain functions are
+        run in a worker thread.
+        """
+        self.status = NodeStatus.RUNNING
+        fingerprint, cached = self._lookup(state)
+        if cached is not None:
+            self.status = NodeStatus.COMPLETED
+            return self._apply(state, cached)
+        try:
+            arg = state if fingerprint is None else self._inputs(state)
+            if inspect.iscoroutinefunction(self.func):
+                updated_state = await self.func(arg)
+            else:
+                updated_state = await asyncio.to_thread(self.func, arg)
+            if fingerprint is not None:
+                updated_state = self._store(fingerprint, state, updated_state)
+            self.status = NodeStatus.COMPLETED
+            return updated_state
+        except Exception as e:
+            self.status = NodeStatus.FAILED
+            raise e
+    
+    def _lookup(self, state: Dict[str, Any]) -> tuple:
+        """Return (fingerprint, cached output) for the node's inputs"""
+        if self.cache_keys is None:
+            return None, None
+        fingerprint = self.cache.fingerprint(self.cache_id, state, self.cache_keys)
+        if fingerprint is None:
+            return None, None
+        return fingerprint, self.cache.get(fingerprint)
+    
+    def _inputs(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        A fresh state holding only the node's cache keys
+        
+        Cached nodes run on this instead of the full state, so the
+        output stored for a fingerprint only depends on what it hashes.
+        Typed state fields the node doesn't depend on hold _UNSET, which
+        tells the keys it wrote apart from ones it left alone.
+        """
+        inputs = type(state)()
+        for key in list(inputs.keys()):
+            inputs[key] = _UNSET
+        inputs.update({key: state[key] for key in self.cache_keys if key in state})
+        return inputs
+    
+    def _store(self, fingerprint: bytes, state: Dict[str, Any],
+               output: Dict[str, Any]) -> Dict[str, Any]:
+        """Remember the keys the node wrote and apply them to the state"""
+        written = {key: value for key, value in output.items()
+                   if value is not _UNSET
+                   and (key not in self.cache_keys or state.get(key, _UNSET) != value)}
+        self.cache.put(fingerprint, {key: _detach(value) for key, value in written.items()})
+        return self._apply(state, written)
+    
+    @staticmethod
+    def _apply(state: Dict[str, Any], written: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of the state with a node's written keys applied"""
+        updated_state = state.copy()
+        for key, value in written.items():
+            updated_state[key] = _detach(value)
+        return updated_state
 
 class WorkflowGraph:
     """Main workflow graph that manages nodes and their connections"""
     
-    def __init__(self, graph_id: str):
+    __slots__ = ("graph_id", "cache", "state_type", "nodes", "edges", "preds", "entry_node",
+                 "node_ids", "node_names", "_compiled_entry", "_node_list", "_next", "_back",
+                 "_cond", "_indegree", "_sequential", "_specialized")
+    
+    max_iterations = 100  # Loop protection: most node runs per workflow run
+    
+    def __init__(self, graph_id: str, cache: Optional[NodeCache] = None,
+                 state_type: Optional[type] = None):
         self.graph_id = graph_id
+        self.cache = cache if cache is not None else node_cache
+        # Optional typed state (e.g. ReviewState) built from the initial dict
+        self.state_type = state_type
         self.nodes: Dict[str, Node] = {}  # node_name -> Node object
-        self.edges: Dict[str, str] = {}  # from_node -> to_node
+        self.edges: Dict[str, List[str]] = {}  # from_node -> [to_node, ...]
+        self.preds: Dict[str, List[str]] = {}  # to_node -> [from_node, ...]
         self.entry_node: Optional[str] = None  # Starting node
+        self.node_ids: Dict[str, int] = {}  # node_name -> integer id
+        self.node_names: List[str] = []  # integer id -> node_name
+        
+        # Jump tables built by compile(), indexed by node id
+        self._compiled_entry: Optional[str] = None  # None until compiled
+        self._node_list: List[Node] = []
+        self._next: List[tuple] = []  # plain successor ids
+        self._back: List[tuple] = []  # successors closing a cycle (no dependency)
+        self._cond: List[Optional[Callable]] = []  # state -> successor id (or -1)
+        self._indegree: List[int] = []
+        self._sequential = False  # single chain of plain functions
+        self._specialized: Optional[Callable] = None  # generated by specialize()
     
-    def add_node(self, name: str, func: Callable):
-        """Add a node to the graph"""
-        self.nodes[name] = Node(name, func)
+    def add_node(self, name: str, func: Callable, cache_keys: Optional[Set[str]] = None):
+        """
+        Add a node to the graph
+        
+        Pass cache_keys (the state keys the node reads) to reuse its output
+        whenever it runs again on the same inputs. Such a node only sees
+        those keys, every other key starts from its default.
+        """
+        self.nodes[name] = Node(name, func, cache_keys, self.cache)
+        if name not in self.node_ids:
+            self.node_ids[name] = len(self.node_names)
+            self.node_names.append(name)
+        self._compiled_entry = None
         # If this is the first node, make it the entry node
         if self.entry_node is None:
             self.entry_node = name
@@ -58,96 +442,396 @@ class WorkflowGraph:
             raise ValueError(f"Node '{from_node}' does not exist")
         if to_node not in self.nodes:
             raise ValueError(f"Node '{to_node}' does not exist")
-        self.edges[from_node] = to_node
+        self.edges.setdefault(from_node, []).append(to_node)
+        self.preds.setdefault(to_node, []).append(from_node)
+        self._compiled_entry = None
     
-    def get_next_node(self, current_node: str) -> Optional[str]:
-        """Get the next node to execute after current_node"""
-        return self.edges.get(current_node)
+    def compile(self):
+        """
+        Build the jump tables the scheduler runs on
+        
+        Edges are resolved to integer node ids and conditional ("if_")
+        edges to a routing function once, so running the graph is plain
+        list indexing. Called automatically by run if the graph changed.
+        """
+        if self.entry_node is None:
+            raise ValueError("No entry node defined")
+        ids = self.node_ids
+        count = len(self.node_names)
+        self._node_list = [self.nodes[name] for name in self.node_names]
+        self._cond = []
+        targets = []  # (successor id, is_conditional) per node
+        for name in self.node_names:
+            next_nodes = self.get_next_nodes(name)
+            has_conditional = any(n.startswith("if_") for n in next_nodes)
+            self._cond.append(self._route if has_conditional else None)
+            targets.append([(ids[n], n.startswith("if_")) for n in next_nodes])
+        
+        # Depth-first walk from the entry node. Plain edges count as
+        # dependencies of their target, except edges pointing back to a
+        # node still on the walk: those close a cycle and simply re-enqueue
+        # the target (conditional edges never count). Nodes the entry walk
+        # doesn't reach can still run through route_to or loop_node, so
+        # they're walked afterwards to classify their edges too, without
+        # counting as dependencies.
+        forward = [[] for _ in range(count)]
+        back = [[] for _ in range(count)]
+        self._indegree = [0] * count
+        entry = ids[self.entry_node]
+        color = [0] * count  # 0 = unvisited, 1 = on the walk, 2 = done
+        for root in [entry, *range(count)]:
+            if color[root]:
+                continue
+            counted = root == entry
+            color[root] = 1
+            stack = [(root, iter(targets[root]))]
+            while stack:
+                nid, successors = stack[-1]
+                for next_id, conditional in successors:
+                    if not conditional:
+                        if color[next_id] == 1:
+                            back[nid].append(next_id)
+                        else:
+                            forward[nid].append(next_id)
+                            if counted:
+                                self._indegree[next_id] += 1
+                    if color[next_id] == 0:
+                        color[next_id] = 1
+                        stack.append((next_id, iter(targets[next_id])))
+                        break
+                else:
+                    color[nid] = 2
+                    stack.pop()
+        self._next = [tuple(successors) for successors in forward]
+        self._back = [tuple(successors) for successors in back]
+        
+        # Graphs that are a single chain of plain functions don't need the
+        # scheduler at all, see _run_inner
+        self._sequential = all(
+            len(self._next[nid]) + len(self._back[nid]) + (self._cond[nid] is not None) <= 1
+            and self._indegree[nid] <= 1
+            and not inspect.iscoroutinefunction(self._node_list[nid].func)
+            for nid in range(count)
+        )
+        self._specialized = None
+        self._compiled_entry = self.entry_node
     
-    def run(self, initial_state: Dict[str, Any]) -> tuple:
+    @property
+    def specialize_ok(self) -> bool:
+        """Whether specialize() can turn this graph into a single function"""
+        self._prepare()
+        return self._sequential and all(cond is None for cond in self._cond)
+    
+    def specialize(self) -> bool:
+        """
+        Generate a straight-line Python function for a static graph
+        
+        The chain of nodes from the entry node is traced once and emitted
+        as one function with every step inlined, so running the graph
+        skips the per-hop table lookups. Nodes without a cache are called
+        directly (their status is not updated). Loops via loop_continue
+        jump back into the chain; a loop to a node outside the chain
+        continues in _run_inner.
+        
+        Returns False (and leaves the graph as is) if the graph isn't
+        specialize_ok. Changing the graph drops the generated function.
+        """
+        if not self.specialize_ok:
+            return False
+        
+        # Trace the chain; a successor already on it closes a cycle
+        chain = []
+        position: Dict[int, int] = {}  # node id -> index in chain
+        cur = self.node_ids[self.entry_node]
+        jump = -1
+        while cur >= 0:
+            if cur in position:
+                jump = position[cur]
+                break
+            position[cur] = len(chain)
+            chain.append(cur)
+            successors = self._next[cur] + self._back[cur]
+            cur = successors[0] if successors else -1
+        
+        namespace = {
+            "RUNNING": NodeStatus.RUNNING,
+            "COMPLETED": NodeStatus.COMPLETED,
+            "FAILED": NodeStatus.FAILED,
+            "max_iterations": self.max_iterations,
+            "ids": self.node_ids,
+            "entry": self.entry_node,
+            "position": position,
+            "run_inner": self._run_inner,
+        }
+        lines = [
+            "def _specialized(state, log):",
+            "    append = log.append",
+            "    statuses = log.statuses",
+            "    snapshot = log.snapshot if log.keep_snapshots else None",
+            "    iteration = 0",
+            "    index = -1",
+            "    start = 0",
+            "    handoff = -1",
+            "    try:",
+            "        while start >= 0:",
+        ]
+        for step, nid in enumerate(chain):
+            node = self._node_list[nid]
+            # Cached nodes need execute() for the cache lookup
+            namespace[f"f{step}"] = node.execute if node.cache_keys is not None else node.func
+            lines += [
+                # Node names never go into the source, only integer ids
+                f"            if start <= {step}:",
+                "                if iteration >= max_iterations:",
+                "                    break",
+                "                iteration += 1",
+                f"                index = append({nid}, RUNNING, iteration)",
+                f"                state = f{step}(state)",
+                "                statuses[index] = COMPLETED",
+                "                if snapshot is not None:",
+                "                    snapshot(index, state)",
+                "                if state.get('loop_continue', False):",
+                "                    target = ids[state.get('loop_node', entry)]",
+                "                    state['loop_continue'] = False",
+                "                    if target not in position:",
+                "                        handoff = target",
+                "                        break",
+                "                    start = position[target]",
+                "                    continue",
+            ]
+        lines += [
+            f"            start = {jump}",
+            "    except Exception as e:",
+            "        statuses[index] = FAILED",
+            "        log.errors[index] = str(e)",
+            "        raise e",
+            "    if handoff >= 0:",
+            "        return run_inner(state, log, handoff, iteration)",
+            "    return state",
+        ]
+        exec(compile("\n".join(lines), f"<specialized {self.graph_id}>", "exec"), namespace)
+        self._specialized = namespace["_specialized"]
+        return True
+    
+    def get_next_nodes(self, current_node: str) -> List[str]:
+        """Get the nodes that follow current_node"""
+        return self.edges.get(current_node, [])
+    
+    def run(self, initial_state: Dict[str, Any], *, log_snapshots: bool = False) -> tuple:
         """
         Execute the workflow starting from entry node
         
+        Blocking version of run_async, so it can't be called from inside
+        a running event loop.
+        
         Returns:
             (final_state, execution_log)
         """
-        if self.entry_node is None:
-            raise ValueError("No entry node defined")
+        self._prepare()
+        if self._sequential:
+            state, execution_log = self._start(initial_state, log_snapshots)
+            run_inner = self._specialized or self._run_inner
+            return run_inner(state, execution_log), execution_log
+        return asyncio.run(self.run_async(initial_state, log_snapshots=log_snapshots))
+    
+    async def run_async(self, initial_state: Dict[str, Any], concurrency: int = 4, *,
+                        log_snapshots: bool = False) -> tuple:
+        """
+        Execute the workflow starting from entry node
+        
+        A node becomes ready once all of its predecessors have completed.
+        Ready nodes are picked up by `concurrency` workers, so independent
+        branches run at the same time. A graph that is a single chain of
+        plain functions runs in one worker thread instead.
         
-        state = initial_state.copy()
-        execution_log = []
-        current_node_name = self.entry_node
-        visited_nodes = set()
+        With log_snapshots, every log entry also records the state after
+        the node ran.
+        
+        Returns:
+            (final_state, execution_log)
+        """
+        self._prepare()
+        state, execution_log = self._start(initial_state, log_snapshots)
+        if self._sequential:
+            run_inner = self._specialized or self._run_inner
+            state = await asyncio.to_thread(run_inner, state, execution_log)
+            return state, execution_log
         
         # Simple loop detection (max iterations)
-        max_iterations = 100
+        max_iterations = self.max_iterations
         iteration = 0
         
-        while current_node_name and iteration < max_iterations:
+        node_list = self._node_list
+        nexts = self._next
+        backs = self._back
+        conds = self._cond
+        indegree = self._indegree
+        log_snapshots = execution_log.keep_snapshots
+        # Per-node count of predecessors that still have to complete
+        remaining = list(indegree)
+        active = 0  # Nodes currently executing
+        ready: asyncio.Queue = asyncio.Queue()
+        ready.put_nowait(self.node_ids[self.entry_node])
+        
+        def finish():
+            # Wake every worker up with a stop marker
+            for _ in range(concurrency):
+                ready.put_nowait(-1)
+        
+        async def worker():
+            nonlocal state, iteration, active
+            try:
+                while True:
+                    cur = await ready.get()
+                    if cur < 0:
+                        return
+                    
+                    if iteration >= max_iterations:
+                        if active == 0 and ready.empty():
+                            finish()
+                        continue
+                    iteration += 1
+                    active += 1
+                    remaining[cur] = indegree[cur]
+                    
+                    # Execute the node
+                    log_index = execution_log.append(cur, NodeStatus.RUNNING, iteration)
+                    
+                    # A node running on its own can work on the state directly,
+                    # parallel branches get their own copy and are merged back
+                    shared = active == 1 and ready.empty()
+                    base = state if shared else state.copy()
+                    try:
+                        result = await node_list[cur].execute_async(base if shared else base.copy())
+                    except Exception as e:
+                        execution_log.statuses[log_index] = NodeStatus.FAILED
+                        execution_log.errors[log_index] = str(e)
+                        raise e
+                    
+                    state = result if shared else self._merge(state, base, result)
+                    execution_log.statuses[log_index] = NodeStatus.COMPLETED
+                    if log_snapshots:
+                        execution_log.snapshot(log_index, state)
+                    
+                    # Release successors whose dependencies are all satisfied
+                    next_ids = []
+                    for next_id in nexts[cur]:
+                        remaining[next_id] -= 1
+                        if remaining[next_id] <= 0:
+                            next_ids.append(next_id)
+                    next_ids.extend(backs[cur])
+                    # Handle conditional routing (check state for routing decisions)
+                    if conds[cur] is not None:
+                        next_id = conds[cur](state)
+                        if next_id >= 0:
+                            next_ids.append(next_id)
+                    
+                    # Check for loop conditions (if state has loop_continue flag)
+                    if state.get("loop_continue", False):
+                        # Reset to entry or specified loop node
+                        next_ids = [self.node_ids[state.get("loop_node", self.entry_node)]]
+                        state["loop_continue"] = False  # Reset flag
+                    
+                    for next_id in next_ids:
+                        ready.put_nowait(next_id)
+                    active -= 1
+                    
+                    # Stop once nothing is running and nothing is ready
+                    if active == 0 and ready.empty():
+                        finish()
+            except Exception:
+                # Stop the other workers too, not just this one
+                finish()
+                raise
+        
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        
+        return state, execution_log
+    
+    def _prepare(self):
+        """Check the graph and (re)build its jump tables if needed"""
+        if self.entry_node is None:
+            raise ValueError("No entry node defined")
+        if self._compiled_entry != self.entry_node:
+            self.compile()
+    
+    def _start(self, initial_state: Dict[str, Any], log_snapshots: bool) -> tuple:
+        """Create the working state and an empty execution log for a run"""
+        if self.state_type is not None and not isinstance(initial_state, self.state_type):
+            state = self.state_type.from_dict(initial_state)
+        else:
+            state = initial_state.copy()
+        return state, ExecutionLog(self.node_names, log_snapshots)
+    
+    def _run_inner(self, state: Dict[str, Any], execution_log: "ExecutionLog",
+                   cur: Optional[int] = None, iteration: int = 0) -> Dict[str, Any]:
+        """
+        Run a sequential graph (see compile) in a plain loop
+        
+        Same semantics as the scheduler, but with at most one successor per
+        node there is nothing to queue: every hop is a list lookup and one
+        call. Node functions run in the calling thread. Starts at the entry
+        node unless cur (and the iterations already used) are given.
+        """
+        node_list = self._node_list
+        nexts = self._next
+        backs = self._back
+        conds = self._cond
+        statuses = execution_log.statuses
+        snapshot = execution_log.snapshot if execution_log.keep_snapshots else None
+        append = execution_log.append
+        max_iterations = self.max_iterations
+        
+        if cur is None:
+            cur = self.node_ids[self.entry_node]
+        while cur >= 0 and iteration < max_iterations:
             iteration += 1
-            
-            # Check if we've been here too many times (loop protection)
-            if current_node_name in visited_nodes and iteration > 10:
-                # Check if we should continue looping based on state
-                # This is handled by conditional edges in the workflow
-                pass
-            
-            node = self.nodes[current_node_name]
-            
-            # Execute the node
-            log_entry = {
-                "node": current_node_name,
-                "status": "running",
-                "iteration": iteration
-            }
-            execution_log.append(log_entry)
-            
+            log_index = append(cur, NodeStatus.RUNNING, iteration)
             try:
-                state = node.execute(state)
-                log_entry["status"] = "completed"
-                log_entry["state_snapshot"] = state.copy()
+                state = node_list[cur].execute(state)
             except Exception as e:
-                log_entry["status"] = "failed"
-                log_entry["error"] = str(e)
-                execution_log.append(log_entry)
+                statuses[log_index] = NodeStatus.FAILED
+                execution_log.errors[log_index] = str(e)
                 raise e
+            statuses[log_index] = NodeStatus.COMPLETED
+            if snapshot is not None:
+                snapshot(log_index, state)
             
-            visited_nodes.add(current_node_name)
-            
-            # Get next node
-            next_node = self.get_next_node(current_node_name)
-            
-            # Handle conditional routing (check state for routing decisions)
-            if next_node and next_node.startswith("if_"):
-                # Simple conditional: if_next_node means check condition
-                # For now, we'll use a simple approach: check state for routing
-                actual_next = self._evaluate_conditional(next_node, state)
-                current_node_name = actual_next
+            if nexts[cur]:
+                next_id = nexts[cur][0]
+            elif backs[cur]:
+                next_id = backs[cur][0]
+            elif conds[cur] is not None:
+                next_id = conds[cur](state)
             else:
-                current_node_name = next_node
+                next_id = -1
             
             # Check for loop conditions (if state has loop_continue flag)
             if state.get("loop_continue", False):
-                # Reset to entry or specified loop node
-                loop_node = state.get("loop_node", self.entry_node)
-                current_node_name = loop_node
+                next_id = self.node_ids[state.get("loop_node", self.entry_node)]
                 state["loop_continue"] = False  # Reset flag
-                continue
-            
-            # Stop if no next node
-            if current_node_name is None:
-                break
+            cur = next_id
         
-        return state, execution_log
+        return state
     
-    def _evaluate_conditional(self, conditional_node: str, state: Dict[str, Any]) -> Optional[str]:
+    @staticmethod
+    def _merge(state: Dict[str, Any], base: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply the keys a branch changed relative to base onto state"""
+        for key, value in result.items():
+            if key not in base or base[key] is not value:
+                state[key] = value
+        for key in base:
+            if key not in result:
+                state.pop(key, None)
+        return state
+    
+    def _route(self, state: Dict[str, Any]) -> int:
         """
         Simple conditional evaluation
-        If state has 'route_to' key, use that, otherwise continue normally
+        If state has 'route_to' key, return that node's id, otherwise -1
         """
         if "route_to" in state:
             next_node = state.pop("route_to")  # Remove after using
-            return next_node if next_node in self.nodes else None
+            return self.node_ids.get(next_node, -1)
         # Default: continue to next edge
-        return None
-
+        return -1
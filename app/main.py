@@ -3,20 +3,61 @@ FastAPI Application
 Main API endpoints for the workflow engine
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import Dict, Any, List, Optional
-import uuid
-from datetime import datetime
+import msgspec
+import base64
+import secrets
+import struct
+import threading
+import time
+from cachetools import LRUCache
 
-from app.engine import WorkflowGraph, Node
+from app.engine import WorkflowGraph, Node, state_to_dict
 from app.workflows import create_code_review_workflow
 
-app = FastAPI(title="Workflow Engine API", version="1.0.0")
+app = FastAPI(title="Workflow Engine API", version="1.0.0",
+              default_response_class=ORJSONResponse)
 
-# In-memory storage
-graphs: Dict[str, WorkflowGraph] = {}
-runs: Dict[str, Dict[str, Any]] = {}  # run_id -> {graph_id, state, log, status}
+# In-memory storage, bounded: the least recently used entries are evicted
+graphs: LRUCache = LRUCache(maxsize=1_000)  # graph_id -> WorkflowGraph
+runs: LRUCache = LRUCache(maxsize=10_000)  # run_id -> {graph_id, state, log, status}
+# Even reads reorder an LRUCache, and sync endpoints run in a thread pool
+_store_lock = threading.Lock()
+
+
+# Maps the RFC 4648 base32 alphabet onto Crockford's (used by ULIDs)
+_CROCKFORD = bytes.maketrans(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ234567",
+                             b"0123456789ABCDEFGHJKMNPQRSTVWXYZ")
+
+
+def _ulid() -> str:
+    """
+    Generate a ULID (48-bit millisecond timestamp + 80 random bits)
+    
+    Sorts by creation time and needs a single random read per id.
+    """
+    raw = struct.pack(">Q", time.time_ns() // 1_000_000)[2:] + secrets.token_bytes(10)
+    # 26 base32 digits hold 130 bits: pad with 2 leading zero bits
+    padded = (int.from_bytes(raw, "big") << 6).to_bytes(17, "big")
+    return base64.b32encode(padded)[:26].translate(_CROCKFORD).decode("ascii")
+
+
+# Formatted local time, refreshed at most once per second
+_clock_second = -1
+_clock_text = ""
+
+
+def _timestamp() -> str:
+    """Current local time as an ISO 8601 string (second precision)"""
+    global _clock_second, _clock_text
+    now = int(time.time())
+    if now != _clock_second:
+        _clock_text = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(now))
+        _clock_second = now
+    return _clock_text
 
 
 # Request/Response Models
@@ -27,26 +68,28 @@ class CreateGraphRequest(BaseModel):
     entry_node: Optional[str] = None
 
 
-class RunGraphRequest(BaseModel):
-    """Request to run a graph"""
-    graph_id: str
-    initial_state: Dict[str, Any]
-
-
 class GraphResponse(BaseModel):
     """Response for graph creation"""
     graph_id: str
     message: str
 
 
-class RunResponse(BaseModel):
+# The run endpoints move the large payloads (states, execution logs), so
+# their models are msgspec Structs decoded/encoded without pydantic
+class RunGraphRequest(msgspec.Struct):
+    """Request to run a graph"""
+    graph_id: str
+    initial_state: Dict[str, Any]
+
+
+class RunResponse(msgspec.Struct):
     """Response for graph execution"""
     run_id: str
     final_state: Dict[str, Any]
     execution_log: List[Dict[str, Any]]
 
 
-class StateResponse(BaseModel):
+class StateResponse(msgspec.Struct):
     """Response for state query"""
     run_id: str
     state: Dict[str, Any]
@@ -54,6 +97,21 @@ class StateResponse(BaseModel):
     execution_log: List[Dict[str, Any]]
 
 
+_run_request_decoder = msgspec.json.Decoder(RunGraphRequest)
+_encoder = msgspec.json.Encoder()
+
+
+def _json_response(content: msgspec.Struct) -> Response:
+    """Encode a Struct straight into a JSON response"""
+    return Response(content=_encoder.encode(content), media_type="application/json")
+
+
+def _openapi_json(struct_type: type) -> Dict[str, Any]:
+    """OpenAPI content entry for a Struct (used to document the run endpoints)"""
+    _, components = msgspec.json.schema_components([struct_type])
+    return {"application/json": {"schema": components[struct_type.__name__]}}
+
+
 @app.get("/")
 def root():
     """Root endpoint"""
@@ -75,7 +133,7 @@ def create_graph(request: CreateGraphRequest):
     For simplicity, we'll create a basic graph structure.
     In a real implementation, you'd parse the nodes and edges properly.
     """
-    graph_id = str(uuid.uuid4())
+    graph_id = _ulid()
     graph = WorkflowGraph(graph_id)
     
     # For this simple version, we'll use a predefined workflow
@@ -93,7 +151,8 @@ def create_graph(request: CreateGraphRequest):
         # In a real system, you'd need a way to register functions
         # For now, we'll just store the structure
         
-        graphs[graph_id] = graph
+        with _store_lock:
+            graphs[graph_id] = graph
         
         return GraphResponse(
             graph_id=graph_id,
@@ -107,7 +166,9 @@ def create_graph(request: CreateGraphRequest):
 def create_example_graph():
     """Create the example code review workflow"""
     graph = create_code_review_workflow()
-    graphs[graph.graph_id] = graph
+    graph.specialize()  # Stays on the generic scheduler if it can't be specialized
+    with _store_lock:
+        graphs[graph.graph_id] = graph
     
     return GraphResponse(
         graph_id=graph.graph_id,
@@ -115,69 +176,88 @@ def create_example_graph():
     )
 
 
-@app.post("/graph/run", response_model=RunResponse)
-def run_graph(request: RunGraphRequest):
+@app.post(
+    "/graph/run",
+    openapi_extra={"requestBody": {"required": True, "content": _openapi_json(RunGraphRequest)}},
+    responses={200: {"content": _openapi_json(RunResponse)}},
+)
+async def run_graph(http_request: Request, snapshots: bool = False):
     """
     Execute a workflow graph with initial state
     
-    Returns the final state and execution log
+    Returns the final state and execution log. Pass ?snapshots=1 to also
+    get the state after every step in the log. The body is decoded and the
+    response encoded with msgspec, since the log can get large.
     """
-    if request.graph_id not in graphs:
+    try:
+        request = _run_request_decoder.decode(await http_request.body())
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    with _store_lock:
+        graph = graphs.get(request.graph_id)
+    if graph is None:
         raise HTTPException(status_code=404, detail="Graph not found")
     
-    graph = graphs[request.graph_id]
-    run_id = str(uuid.uuid4())
+    run_id = _ulid()
     
     try:
         # Execute the workflow
-        final_state, execution_log = graph.run(request.initial_state)
+        final_state, execution_log = await graph.run_async(request.initial_state, log_snapshots=snapshots)
+        final_state = state_to_dict(final_state)
         
         # Store run information
-        runs[run_id] = {
-            "graph_id": request.graph_id,
-            "state": final_state,
-            "log": execution_log,
-            "status": "completed",
-            "created_at": datetime.now().isoformat()
-        }
+        with _store_lock:
+            runs[run_id] = {
+                "graph_id": request.graph_id,
+                "state": final_state,
+                "log": execution_log,
+                "status": "completed",
+                "created_at": _timestamp()
+            }
         
-        return RunResponse(
+        return _json_response(RunResponse(
             run_id=run_id,
             final_state=final_state,
-            execution_log=execution_log
-        )
+            execution_log=execution_log.to_list()
+        ))
     except Exception as e:
         # Store failed run
-        runs[run_id] = {
-            "graph_id": request.graph_id,
-            "state": request.initial_state,
-            "log": [],
-            "status": "failed",
-            "error": str(e),
-            "created_at": datetime.now().isoformat()
-        }
+        with _store_lock:
+            runs[run_id] = {
+                "graph_id": request.graph_id,
+                "state": request.initial_state,
+                "log": None,
+                "status": "failed",
+                "error": str(e),
+                "created_at": _timestamp()
+            }
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/graph/state/{run_id}", response_model=StateResponse)
+@app.get("/graph/state/{run_id}", responses={200: {"content": _openapi_json(StateResponse)}})
 def get_state(run_id: str):
-    """Get the current state of a workflow run"""
-    if run_id not in runs:
+    """Get the current state of a workflow run (encoded like run_graph)"""
+    with _store_lock:
+        run_data = runs.get(run_id)
+    if run_data is None:
         raise HTTPException(status_code=404, detail="Run not found")
     
-    run_data = runs[run_id]
+    log = run_data.get("log")
     
-    return StateResponse(
+    return _json_response(StateResponse(
         run_id=run_id,
         state=run_data["state"],
         status=run_data["status"],
-        execution_log=run_data.get("log", [])
-    )
+        execution_log=log.to_list() if log is not None else []
+    ))
 
 
 @app.get("/graphs")
 def list_graphs():
     """List all created graphs"""
+    with _store_lock:
+        items = list(graphs.items())
     return {
         "graphs": [
             {
@@ -185,7 +265,7 @@ def list_graphs():
                 "node_count": len(graph.nodes),
                 "entry_node": graph.entry_node
             }
-            for graph_id, graph in graphs.items()
+            for graph_id, graph in items
         ]
     }
 
@@ -193,6 +273,8 @@ def list_graphs():
 @app.get("/runs")
 def list_runs():
     """List all workflow runs"""
+    with _store_lock:
+        items = list(runs.items())
     return {
         "runs": [
             {
@@ -201,7 +283,7 @@ def list_runs():
                 "status": data["status"],
                 "created_at": data.get("created_at")
             }
-            for run_id, data in runs.items()
+            for run_id, data in items
         ]
     }
 
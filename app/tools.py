@@ -3,7 +3,10 @@ Tool Registry
 Simple dictionary-based registry for tools that nodes can use
 """
 
-from typing import Dict, Callable, Any, List
+import asyncio
+from typing import Dict, Callable, Any, List, Tuple
+
+from app._fastscan import token_counts
 
 
 class ToolRegistry:
@@ -22,6 +25,15 @@ class ToolRegistry:
             raise ValueError(f"Tool '{name}' not found in registry")
         return self.tools[name]
     
+    def bind(self, name: str) -> Callable:
+        """
+        Resolve a tool once, e.g. when building a workflow
+        
+        Fails right away for unknown tools; the returned function can then
+        be called from node bodies without a registry lookup.
+        """
+        return self.get(name)
+    
     def list_tools(self) -> List[str]:
         """List all registered tool names"""
         return list(self.tools.keys())
@@ -34,24 +46,61 @@ tool_registry = ToolRegistry()
 # Example tools (these can be used by nodes)
 def detect_smells(code: str) -> Dict[str, Any]:
     """Simple code smell detection"""
+    return _smells(code, token_counts(code))
+
+
+def check_complexity(code: str) -> Dict[str, Any]:
+    """Simple complexity check"""
+    return _complexity(token_counts(code))
+
+
+def analyze_code(code: str) -> Dict[str, Any]:
+    """Complexity check and smell detection in one go (the code is scanned once)"""
+    counts = token_counts(code)
+    result = _smells(code, counts)
+    result.update(_complexity(counts))
+    return result
+
+
+# Async versions for coroutine nodes: the scan runs in a worker thread so
+# parallel branches don't block the event loop
+async def detect_smells_async(code: str) -> Dict[str, Any]:
+    """detect_smells without blocking the event loop"""
+    return _smells(code, await asyncio.to_thread(token_counts, code))
+
+
+async def check_complexity_async(code: str) -> Dict[str, Any]:
+    """check_complexity without blocking the event loop"""
+    return _complexity(await asyncio.to_thread(token_counts, code))
+
+
+async def analyze_code_async(code: str) -> Dict[str, Any]:
+    """analyze_code without blocking the event loop"""
+    return await asyncio.to_thread(analyze_code, code)
+
+
+def _smells(code: str, counts: Tuple[int, ...]) -> Dict[str, Any]:
+    """Smell detection from precomputed token counts"""
+    n_if, _, _, _, n_todo, n_fixme = counts
     issues = []
     if len(code) > 1000:
         issues.append("Code too long")
-    if code.count("if") > 10:
+    if n_if > 10:
         issues.append("Too many conditionals")
-    if "TODO" in code or "FIXME" in code:
+    if n_todo or n_fixme:
         issues.append("Contains TODO/FIXME")
     
     return {"issues": issues, "issue_count": len(issues)}
 
 
-def check_complexity(code: str) -> Dict[str, Any]:
-    """Simple complexity check"""
+def _complexity(counts: Tuple[int, ...]) -> Dict[str, Any]:
+    """Complexity score from precomputed token counts"""
+    n_if, n_for, n_while, n_def, _, _ = counts
     complexity_score = 0
-    complexity_score += code.count("if") * 2
-    complexity_score += code.count("for") * 3
-    complexity_score += code.count("while") * 4
-    complexity_score += code.count("def") * 1
+    complexity_score += n_if * 2
+    complexity_score += n_for * 3
+    complexity_score += n_while * 4
+    complexity_score += n_def * 1
     
     return {"complexity_score": complexity_score}
 
@@ -71,5 +120,9 @@ def calculate_quality_score(state: Dict[str, Any]) -> Dict[str, Any]:
 # Register example tools
 tool_registry.register("detect_smells", detect_smells)
 tool_registry.register("check_complexity", check_complexity)
+tool_registry.register("analyze_code", analyze_code)
+tool_registry.register("detect_smells_async", detect_smells_async)
+tool_registry.register("check_complexity_async", check_complexity_async)
+tool_registry.register("analyze_code_async", analyze_code_async)
 tool_registry.register("calculate_quality_score", calculate_quality_score)
 
@@ -0,0 +1,268 @@
+"""
+Regression checks for the workflow engine
+Runs without the server: python test_engine.py (or pytest test_engine.py)
+"""
+
+import asyncio
+import random
+import re
+
+from app import _fastscan
+from app.engine import NodeCache, WorkflowGraph, state_to_dict
+from app.workflows import create_code_review_workflow
+
+
+def mark(name):
+    """A node that appends its name to state["trace"]"""
+    def node(state):
+        state["trace"] = state.get("trace", []) + [name]
+        return state
+    node.__name__ = name
+    return node
+
+
+def run_both(graph, initial_state):
+    """Run a graph with run() and the async scheduler, return both traces"""
+    state, log = graph.run(dict(initial_state))
+    async_state, async_log = asyncio.run(graph.run_async(dict(initial_state)))
+    nodes = [entry["node"] for entry in log.to_list()]
+    async_nodes = [entry["node"] for entry in async_log.to_list()]
+    return (state, nodes), (async_state, async_nodes)
+
+
+def test_edge_cycle():
+    """A plain edge back to an earlier node loops until max_iterations"""
+    graph = WorkflowGraph("cycle")
+    for name in ["a", "b", "c"]:
+        graph.add_node(name, mark(name))
+    graph.add_edge("a", "b")
+    graph.add_edge("b", "c")
+    graph.add_edge("c", "b")
+
+    for state, nodes in run_both(graph, {}):
+        assert len(nodes) == graph.max_iterations
+        assert nodes[:6] == ["a", "b", "c", "b", "c", "b"]
+
+
+def test_route_to():
+    """route_to picks the conditional target, which then follows its own edges"""
+    def a(state):
+        state["route_to"] = "z"
+        return state
+
+    graph = WorkflowGraph("route")
+    graph.add_node("a", a)
+    graph.add_node("if_x", mark("if_x"))
+    graph.add_node("z", mark("z"))
+    graph.add_node("w", mark("w"))
+    graph.add_edge("a", "if_x")
+    graph.add_edge("z", "w")
+
+    for state, nodes in run_both(graph, {}):
+        assert nodes == ["a", "z", "w"]
+        assert state["trace"] == ["z", "w"]
+
+
+def test_fan_in():
+    """A node with several predecessors runs once, after all of them"""
+    def branch(key):
+        def node(state):
+            state[key] = True
+            return state
+        return node
+
+    def d(state):
+        state["joined"] = state.get("b") and state.get("c")
+        return state
+
+    graph = WorkflowGraph("fan_in")
+    graph.add_node("a", branch("a"))
+    graph.add_node("b", branch("b"))
+    graph.add_node("c", branch("c"))
+    graph.add_node("d", d)
+    graph.add_edge("a", "b")
+    graph.add_edge("a", "c")
+    graph.add_edge("b", "d")
+    graph.add_edge("c", "d")
+
+    for state, nodes in run_both(graph, {}):
+        assert nodes[0] == "a" and nodes[-1] == "d"
+        assert sorted(nodes[1:3]) == ["b", "c"]
+        assert state["joined"] is True
+
+
+def test_failed_run_stops_workers():
+    """An error outside a node still stops every run_async worker"""
+    def b(state):
+        state["loop_continue"] = True
+        state["loop_node"] = "missing"
+        return state
+
+    graph = WorkflowGraph("failing")
+    graph.add_node("a", mark("a"))
+    graph.add_node("b", b)
+    graph.add_node("c", mark("c"))
+    graph.add_edge("a", "b")
+    graph.add_edge("a", "c")
+
+    async def run():
+        try:
+            await graph.run_async({}, concurrency=4)
+        except KeyError:
+            pass
+        else:
+            raise AssertionError("unknown loop_node should raise")
+        await asyncio.sleep(0)
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(run()) == []
+
+
+def test_cache_hit():
+    """A cached node runs once per input and a hit gives the same result"""
+    calls = []
+
+    def count_defs(state):
+        calls.append(state["code"])
+        state["function_count"] = state["code"].count("def ")
+        state["extracted"] = True
+        return state
+
+    graph = WorkflowGraph("cached", cache=NodeCache())
+    graph.add_node("extract", count_defs, cache_keys={"code"})
+    code = "def f(): pass\ndef g(): pass"
+
+    # Outputs equal to the input must still be stored
+    first, _ = graph.run({"code": code, "extracted": True, "function_count": 1})
+    second, _ = graph.run({"code": code})
+    third, _ = asyncio.run(graph.run_async({"code": code}))
+    assert calls == [code]
+    for state in (first, second, third):
+        assert state["extracted"] is True
+        assert state["function_count"] == 2
+
+    # Typed state: writes equal to a field default still count
+    for _ in range(2):
+        state, log = create_code_review_workflow().run(
+            {"code": "def f(): pass", "issue_count": 5, "issues": ["stale"]})
+        assert state.issue_count == 0 and state.issues == []
+        assert state.quality_met is True
+        assert len(log.to_list()) == 5
+        # Changing the output in place must not reach the cache
+        state.issues.append("changed")
+
+
+def test_cache_per_function():
+    """Graphs reusing a node name for a different function don't share outputs"""
+    def constant(value):
+        def node(state):
+            state["out"] = value
+            return state
+        return node
+
+    cache = NodeCache()
+    results = []
+    for value in (1, 2):
+        graph = WorkflowGraph(f"g{value}", cache=cache)
+        graph.add_node("n", constant(value), cache_keys={"x"})
+        results.append(graph.run({"x": 0})[0]["out"])
+    assert results == [1, 2]
+
+
+def test_loop_node_off_chain():
+    """A loop_node outside the entry chain still follows its own edges"""
+    def b(state):
+        state["loop_continue"] = not state.get("looped")
+        state["loop_node"] = "x"
+        state["looped"] = True
+        return state
+
+    graph = WorkflowGraph("off_chain")
+    graph.add_node("a", mark("a"))
+    graph.add_node("b", b)
+    graph.add_node("x", mark("x"))
+    graph.add_node("y", mark("y"))
+    graph.add_edge("a", "b")
+    graph.add_edge("x", "y")
+
+    for state, nodes in run_both(graph, {}):
+        assert nodes == ["a", "b", "x", "y"]
+
+
+def test_specialize_matches_generic():
+    """A specialized graph gives the same state and log as the scheduler"""
+    code = "def f():\n    if x:\n        pass\n# TODO: tidy"
+    for threshold in (10, 101):
+        initial_state = {"code": code, "threshold": threshold}
+        graph = create_code_review_workflow()
+        state, log = graph.run(dict(initial_state))
+        assert graph.specialize()
+        specialized_state, specialized_log = graph.run(dict(initial_state))
+        assert state_to_dict(specialized_state) == state_to_dict(state)
+        nodes = [(entry["node"], entry["status"]) for entry in log.to_list()]
+        specialized_nodes = [(entry["node"], entry["status"])
+                             for entry in specialized_log.to_list()]
+        assert specialized_nodes == nodes
+
+    # The off-chain loop target is handed over to the generic loop
+    graph = WorkflowGraph("handoff")
+    graph.add_node("a", mark("a"))
+    graph.add_node("b", lambda state: {**state, "loop_continue": not state.get("looped"),
+                                       "loop_node": "x", "looped": True})
+    graph.add_node("x", mark("x"))
+    graph.add_node("y", mark("y"))
+    graph.add_edge("a", "b")
+    graph.add_edge("x", "y")
+    assert graph.specialize()
+    state, log = graph.run({})
+    assert [entry["node"] for entry in log.to_list()] == ["a", "b", "x", "y"]
+
+    # Node names are data, not part of the generated source
+    name = "a\nraise SystemExit"
+    graph = WorkflowGraph("names")
+    graph.add_node(name, mark(name))
+    assert graph.specialize()
+    state, log = graph.run({})
+    assert state["trace"] == [name]
+
+
+def test_snapshots_match_final_state():
+    """Typed state snapshots have the same shape as the final state"""
+    graph = create_code_review_workflow()
+    state, log = graph.run({"code": "def f(): pass", "threshold": 10}, log_snapshots=True)
+    final_state = state_to_dict(state)
+    assert "loop_node" not in final_state
+    assert log.to_list()[-1]["state_snapshot"] == final_state
+
+
+def test_token_scanners_match_str_count():
+    """Every token scanner counts like str.count, also for ifor/defor overlaps"""
+    rng = random.Random(0)
+    codes = ["", "if", "ifor", "defor", "deforifor", "iffor", "def for if ifor",
+             "TODOFIXME whilewhile", "# TODO: délai\nfor x in y: pass"]
+    codes += ["".join(rng.choice(["if", "or", "de", "f", "for", "while", "TODO",
+                                  "FIXME", "i", " ", "\n"]) for _ in range(200))
+              for _ in range(200)]
+    # Long enough for token_counts to pick the numpy scanner
+    codes.append("deforifor while TODO " * (_fastscan._NUMPY_MIN_LENGTH // 10))
+
+    regex = re.compile(_fastscan._TOKEN_PATTERN)
+    for code in codes:
+        expected = tuple(code.count(token) for token in _fastscan.TOKENS)
+        # The re2 pattern has the same leftmost-first semantics in re
+        assert _fastscan._tally(regex.findall(code)) == expected, code
+        if _fastscan.np is not None:
+            assert _fastscan._scan_numpy(code) == expected, code
+        if _fastscan.re2 is not None:
+            assert _fastscan._scan_re2(code) == expected, code
+        if _fastscan.numba is not None:
+            buf = _fastscan.np.frombuffer(code.encode("utf-8"), dtype=_fastscan.np.uint8)
+            assert _fastscan._scan(buf) == expected, code
+        assert _fastscan.token_counts(code) == expected, code
+
+
+if __name__ == "__main__":
+    for name, check in list(globals().items()):
+        if name.startswith("test_"):
+            check()
+            print(f"✓ {name}")